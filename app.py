@@ -1,52 +1,137 @@
 from fileinput import filename
 from typing import Dict, List
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
+from flask.json.provider import JSONProvider
 from werkzeug.utils import secure_filename
 import os
 import json
-import fitz  # PyMuPDF
-from docx import Document
+import zipfile
+from xml.etree import ElementTree
 import re
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
 from io import BytesIO
 import base64
+import hashlib
+import threading
 from groq_api import GroqAPI
 import time
 import math
-from functools import wraps
-from document_analyzer import DocumentAnalyzer
+from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from document_analyzer import DocumentAnalyzer, KeywordScanner
+from cache import LRUCache
+from pdf_extractor import extract_text_from_pdf, extract_text_from_pdf_bytes
 import logging
 import numpy as np
-from sentence_transformers import SentenceTransformer, util
-import faiss
-import pickle
+import orjson
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, which is much faster on large document texts"""
+    
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Build the body from orjson's bytes directly instead of going through str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.OPTIONS), mimetype='application/json')
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config['SECRET_KEY'] = 'b97176f45315f8b8619a91bcd13888339bfe7f7993767f98764cf5e21fc9192f'
 app.config['UPLOAD_FOLDER'] = 'Uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['VECTOR_DB_PATH'] = os.path.join(app.config['UPLOAD_FOLDER'], 'vector_db')
+app.config['CACHE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], '.cache')
 
-# Ensure upload and vector DB directories exist
+# Ensure upload, vector DB and cache directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['VECTOR_DB_PATH'], exist_ok=True)
+os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
+
+# When the app is started with `python app.py`, the spawned PDF worker processes
+# re-import this script as __mp_main__. They never serve requests, so they skip the
+# startup checks and work below, and torch, sentence_transformers and faiss are only
+# imported inside the functions that use them
+IS_PDF_WORKER = __name__ == '__mp_main__'
 
 # Load TEAM_BEARER_TOKEN from environment
 TEAM_BEARER_TOKEN = os.getenv("TEAM_BEARER_TOKEN")
-if not TEAM_BEARER_TOKEN:
+if not TEAM_BEARER_TOKEN and not IS_PDF_WORKER:
     logger.error("TEAM_BEARER_TOKEN not set in environment")
     raise ValueError("TEAM_BEARER_TOKEN environment variable is required")
 
-# Initialize Groq API client, DocumentAnalyzer, and embedding model
+EMBEDDING_BATCH_SIZE = 64
+
+# Documents with at least this many chunks get an HNSW graph index;
+# below it a flat scan is faster than building the graph
+HNSW_MIN_CHUNKS = 500
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 32
+
+# A query whose embedding is at least this similar to an earlier query on the same
+# document and query type reuses that query's answer instead of calling Groq
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAX_ANSWERS = 256
+
+# Document download settings for hackrx requests
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_POOL_SIZE = 16
+
+# Keep-alive session for document downloads, so repeated requests for documents on
+# the same host skip the TCP and TLS handshake
+download_session = requests.Session()
+download_session.mount('https://', HTTPAdapter(pool_maxsize=DOWNLOAD_POOL_SIZE))
+download_session.mount('http://', HTTPAdapter(pool_maxsize=DOWNLOAD_POOL_SIZE))
+
+# Shared pool for work that can overlap within a single request
+background_executor = ThreadPoolExecutor(max_workers=4)
+
+# Initialize Groq API client and DocumentAnalyzer; both are cheap, since GroqAPI only
+# connects on its first request
 groq_client = GroqAPI()
 document_analyzer = DocumentAnalyzer()
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+
+# The embedding model is loaded on first use rather than at import, so PDF worker
+# processes never load it (or a CUDA context)
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """Load the sentence embedding model on first use"""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            import torch
+            from sentence_transformers import SentenceTransformer
+            
+            # Run embeddings on the GPU when one is available
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+            if device == 'cuda':
+                # Half precision runs faster on the GPU; embeddings are cast back to float32 for FAISS
+                model = model.half()
+            _embedding_model = model
+    return _embedding_model
+
+# Warm the model up in the background so the first upload does not wait for it
+if not IS_PDF_WORKER:
+    background_executor.submit(get_embedding_model)
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'doc'}
@@ -58,26 +143,47 @@ def estimate_tokens(text):
     """Estimate token count (approximate: 1 token ~ 4 chars in English text)"""
     return len(text) // 4
 
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file"""
-    try:
-        doc = fitz.open(file_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text
-    except Exception as e:
-        return "Error extracting text from PDF: " + str(e)
+# WordprocessingML elements read when streaming the body of a DOCX file
+DOCX_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCX_BODY = DOCX_NS + 'body'
+DOCX_PARAGRAPH = DOCX_NS + 'p'
+DOCX_RUN = DOCX_NS + 'r'
+DOCX_TEXT = DOCX_NS + 't'
+DOCX_BREAKS = {DOCX_NS + 'tab': '\t', DOCX_NS + 'br': '\n', DOCX_NS + 'cr': '\n'}
 
 def extract_text_from_docx(file_path):
     """Extract text from DOCX file"""
     try:
-        doc = Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+        paragraphs = []
+        parts = []
+        # Tags of the element being parsed and its ancestors, from w:document down
+        path = []
+        # Stream word/document.xml instead of building the whole document tree
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as document_xml:
+            for event, element in ElementTree.iterparse(document_xml, events=('start', 'end')):
+                if event == 'start':
+                    path.append(element.tag)
+                    continue
+                
+                # Like python-docx's doc.paragraphs, only body paragraphs are read, and
+                # only the text, tabs and breaks directly inside their runs. Tables,
+                # text boxes (with their fallback copies) and tab stops are skipped
+                depth = len(path)
+                if depth == 5 and path[1] == DOCX_BODY and path[2] == DOCX_PARAGRAPH and path[3] == DOCX_RUN:
+                    tag = element.tag
+                    if tag == DOCX_TEXT:
+                        if element.text:
+                            parts.append(element.text)
+                    elif tag in DOCX_BREAKS:
+                        parts.append(DOCX_BREAKS[tag])
+                elif depth == 3 and path[1] == DOCX_BODY:
+                    if element.tag == DOCX_PARAGRAPH:
+                        paragraphs.append("".join(parts))
+                        parts = []
+                    # The body element has been read, so free it
+                    element.clear()
+                path.pop()
+        return "\n".join(paragraphs)
     except Exception as e:
         return "Error extracting text from DOCX: " + str(e)
 
@@ -89,6 +195,14 @@ def extract_text_from_txt(file_path):
     except Exception as e:
         return "Error extracting text from TXT: " + str(e)
 
+# The extractors return a message instead of text when they fail
+EXTRACTION_ERROR_PREFIX = "Error extracting text from "
+UNSUPPORTED_FORMAT_MESSAGE = "Unsupported file format"
+
+def is_extraction_error(text):
+    """Check whether an extractor returned an error message rather than document text"""
+    return text.startswith(EXTRACTION_ERROR_PREFIX) or text == UNSUPPORTED_FORMAT_MESSAGE
+
 def process_document(file_path):
     """Process document and extract text based on file type"""
     file_extension = file_path.rsplit('.', 1)[1].lower()
@@ -100,45 +214,152 @@ def process_document(file_path):
     elif file_extension == 'txt':
         return extract_text_from_txt(file_path)
     else:
-        return "Unsupported file format"
+        return UNSUPPORTED_FORMAT_MESSAGE
+
+# Versions of the extraction and analysis output, part of their disk cache keys. Bump
+# one whenever its extractors or analyzers change what they return, so results written
+# by an older deploy are not served again
+EXTRACTION_CACHE_VERSION = 2
+ANALYSIS_CACHE_VERSION = 2
+
+# Recently extracted texts and analyses, keyed by content hash
+extracted_text_cache = LRUCache(maxsize=256)
+analysis_cache = LRUCache(maxsize=256)
+# Texts of uploaded documents by index id, so clients send the id instead of the text.
+# Each text is also saved next to its vector index, so any worker process can load it
+# and it survives restarts; the cache only keeps recently used ones in memory
+document_store = LRUCache(maxsize=128)
+
+# Index ids are the hex digests made by get_document_hash; anything else is rejected
+# before it can be used in a file path
+INDEX_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+def save_upload(file, file_path):
+    """Stream an uploaded file to disk and return the SHA-256 of its bytes."""
+    digest = hashlib.sha256()
+    # Hash each block as it is written so the saved file is never read back
+    with open(file_path, 'wb') as f:
+        for block in iter(lambda: file.stream.read(64 * 1024), b''):
+            f.write(block)
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_temp_path(path):
+    """Return a temporary path next to path that is unique to this process and thread."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def write_bytes_atomic(path, data):
+    """Write bytes through a temporary file so concurrent readers never see a partial file."""
+    temp_path = get_temp_path(path)
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def write_json_atomic(path, data):
+    """Write JSON through a temporary file so concurrent readers never see a partial file."""
+    write_bytes_atomic(path, orjson.dumps(data))
+
+def save_array_atomic(path, array):
+    """Save a numpy array through a temporary file so concurrent readers never see a partial file."""
+    temp_path = get_temp_path(path)
+    # Saving to an open file keeps np.save from appending .npy to the temporary name
+    with open(temp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+def get_document_text_path(index_id):
+    """Return the path of the saved text of an uploaded document."""
+    return os.path.join(app.config['VECTOR_DB_PATH'], f"{index_id}_text.txt")
+
+def store_document_text(index_id, document_text):
+    """Keep an uploaded document's text in memory and on disk under its index id."""
+    document_store.put(index_id, document_text)
+    text_path = get_document_text_path(index_id)
+    if not os.path.exists(text_path):
+        write_bytes_atomic(text_path, document_text.encode('utf-8'))
+
+def load_document_text(index_id):
+    """Return the text of an uploaded document, or None if there is none for this id."""
+    if not isinstance(index_id, str) or not INDEX_ID_RE.fullmatch(index_id):
+        return None
+    document_text = document_store.get(index_id)
+    if document_text is None:
+        # Uploaded to another worker, or before a restart
+        text_path = get_document_text_path(index_id)
+        if not os.path.exists(text_path):
+            return None
+        with open(text_path, 'rb') as f:
+            document_text = f.read().decode('utf-8')
+        document_store.put(index_id, document_text)
+    return document_text
+
+def process_document_cached(file_path, file_hash):
+    """Extract document text, reusing the text extracted earlier from identical bytes."""
+    cache_key = f"{file_hash}_{file_path.rsplit('.', 1)[1].lower()}_v{EXTRACTION_CACHE_VERSION}"
+    document_text = extracted_text_cache.get(cache_key)
+    if document_text is not None:
+        return document_text
+    
+    cache_path = os.path.join(app.config['CACHE_FOLDER'], f"{cache_key}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            document_text = orjson.loads(f.read())['text']
+        logger.debug(f"Loaded cached text for {cache_key}")
+    else:
+        document_text = process_document(file_path)
+        if is_extraction_error(document_text):
+            # The failure may be transient, so the next upload of this file tries again
+            return document_text
+        write_json_atomic(cache_path, {'text': document_text})
+    
+    extracted_text_cache.put(cache_key, document_text)
+    return document_text
+
+# Keyword tables for analyze_document_content
+INSURANCE_KEYWORDS = (
+    'insurance', 'policy', 'coverage', 'premium', 'sum insured', 'policy period',
+    'policyholder', 'insured', 'claim', 'exclusion', 'waiting period', 'grace period',
+    'cumulative bonus', 'portability', 'renewal', 'deductible', 'co-payment'
+)
+# Checked in order; the first type with any keyword present wins
+DOCUMENT_TYPE_KEYWORDS = (
+    ("Legal Contract", ('contract', 'agreement', 'terms', 'conditions')),
+    ("HR Document", ('employment', 'hr', 'human resources', 'employee')),
+    ("Compliance Document", ('compliance', 'regulation', 'regulatory', 'legal')),
+)
+SECTION_KEYWORDS = (
+    ('coverage', 'Coverage Details'),
+    ('exclusion', 'Exclusions'),
+    ('claim', 'Claims Process'),
+    ('term', 'Terms and Conditions'),
+    ('liability', 'Liability'),
+)
+CONTENT_KEYWORD_SCANNER = KeywordScanner(
+    INSURANCE_KEYWORDS
+    + tuple(keyword for _, keywords in DOCUMENT_TYPE_KEYWORDS for keyword in keywords)
+    + tuple(keyword for keyword, _ in SECTION_KEYWORDS)
+)
 
 def analyze_document_content(document_text):
     """Analyze document content to determine type and extract key information"""
-    text_lower = document_text.lower()
+    # Find every keyword in one pass over the text instead of one pass per keyword
+    found_keywords = CONTENT_KEYWORD_SCANNER.scan(document_text.lower())
     
     document_type = "General Document"
     
-    # Enhanced insurance policy detection with more keywords
-    insurance_keywords = [
-        'insurance', 'policy', 'coverage', 'premium', 'sum insured', 'policy period',
-        'policyholder', 'insured', 'claim', 'exclusion', 'waiting period', 'grace period',
-        'cumulative bonus', 'portability', 'renewal', 'deductible', 'co-payment'
-    ]
-    
     # Count how many insurance keywords appear in the document
-    insurance_keyword_count = sum(1 for keyword in insurance_keywords if keyword in text_lower)
+    insurance_keyword_count = len(found_keywords.intersection(INSURANCE_KEYWORDS))
     
     # If we have at least 3 insurance keywords, classify as insurance policy
     if insurance_keyword_count >= 3:
         document_type = "Insurance Policy"
-    elif any(keyword in text_lower for keyword in ['contract', 'agreement', 'terms', 'conditions']):
-        document_type = "Legal Contract"
-    elif any(keyword in text_lower for keyword in ['employment', 'hr', 'human resources', 'employee']):
-        document_type = "HR Document"
-    elif any(keyword in text_lower for keyword in ['compliance', 'regulation', 'regulatory', 'legal']):
-        document_type = "Compliance Document"
-    
-    key_sections = []
-    if 'coverage' in text_lower:
-        key_sections.append('Coverage Details')
-    if 'exclusion' in text_lower:
-        key_sections.append('Exclusions')
-    if 'claim' in text_lower:
-        key_sections.append('Claims Process')
-    if 'term' in text_lower:
-        key_sections.append('Terms and Conditions')
-    if 'liability' in text_lower:
-        key_sections.append('Liability')
+    else:
+        for candidate_type, keywords in DOCUMENT_TYPE_KEYWORDS:
+            if found_keywords.intersection(keywords):
+                document_type = candidate_type
+                break
+    
+    key_sections = [section for keyword, section in SECTION_KEYWORDS if keyword in found_keywords]
     
     return {
         'document_type': document_type,
@@ -148,42 +369,150 @@ def analyze_document_content(document_text):
         'summary': "This appears to be a " + document_type.lower() + " containing " + str(len(key_sections)) + " main sections."
     }
 
+WHITESPACE_RE = re.compile(r'\s+')
+
+@lru_cache(maxsize=8)
+def get_chunk_pattern(chunk_size):
+    """Compile a pattern matching runs of up to chunk_size whitespace-separated words."""
+    return re.compile(r'\S+(?:\s+\S+){0,%d}' % (chunk_size - 1))
+
 def split_document(text, chunk_size=300):
     """Split the document into chunks of specified size."""
-    words = text.split()
-    chunks = [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
-    return chunks
+    # Match whole chunks directly rather than materializing a list of every word
+    return [WHITESPACE_RE.sub(' ', match.group()) for match in get_chunk_pattern(chunk_size).finditer(text)]
+
+def get_index_paths(filename):
+    """Return the FAISS index, chunk bytes and chunk offsets file paths for a document."""
+    vector_db_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{filename}.faiss")
+    chunks_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{filename}_chunks.npy")
+    offsets_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{filename}_offsets.npy")
+    return vector_db_path, chunks_path, offsets_path
+
+def index_files_exist(filename):
+    """Check that every file of a document's vector index is on disk."""
+    return all(os.path.exists(path) for path in get_index_paths(filename))
+
+class ChunkStore:
+    """Read-only list of chunks backed by UTF-8 bytes and offsets arrays.
+    
+    The arrays are memory-mapped, so only the chunks that are accessed get decoded.
+    """
+    
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.data[start:end].tobytes().decode('utf-8')
+    
+    @staticmethod
+    def save(chunks, chunks_path, offsets_path):
+        """Write chunks as one concatenated byte array plus chunk boundary offsets."""
+        encoded = [chunk.encode('utf-8') for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+        save_array_atomic(chunks_path, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        save_array_atomic(offsets_path, offsets)
+    
+    @classmethod
+    def load(cls, chunks_path, offsets_path):
+        return cls(np.load(chunks_path, mmap_mode='r'), np.load(offsets_path, mmap_mode='r'))
 
 def create_vector_index(chunks, filename):
     """Create and save FAISS index for document chunks."""
-    embeddings = embedding_model.encode(chunks, convert_to_tensor=False)
-    embeddings = np.array(embeddings, dtype='float32')
+    import faiss
+    
+    # Normalized embeddings make inner product equal to cosine similarity
+    embeddings = get_embedding_model().encode(
+        chunks,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
+    embeddings = np.asarray(embeddings, dtype='float32')
     
+    # Vectors are stored as 8-bit scalars, a quarter of the float32 size
     dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
+    if len(chunks) >= HNSW_MIN_CHUNKS:
+        index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    index.train(embeddings)
     index.add(embeddings)
     
-    vector_db_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{filename}.faiss")
-    chunks_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{filename}_chunks.pkl")
-    faiss.write_index(index, vector_db_path)
-    with open(chunks_path, 'wb') as f:
-        pickle.dump(chunks, f)
+    # Every file is written under a temporary name and renamed into place, so readers never
+    # load a partial file, and arrays already memory-mapped by load_vector_index are never
+    # truncated underneath it. The index goes last, as index_files_exist needs all three
+    vector_db_path, chunks_path, offsets_path = get_index_paths(filename)
+    ChunkStore.save(chunks, chunks_path, offsets_path)
+    temp_path = get_temp_path(vector_db_path)
+    faiss.write_index(index, temp_path)
+    os.replace(temp_path, vector_db_path)
     
     logger.debug(f"Created FAISS index for {filename}, {len(chunks)} chunks")
     return vector_db_path, chunks_path
 
+def select_chunks_within_budget(chunk_ids, chunks, max_tokens):
+    """Collect ranked chunks until the token budget is used, truncating the last one."""
+    # FAISS pads missing results with -1
+    ranked_chunks = [chunks[idx] for idx in chunk_ids if 0 <= idx < len(chunks)]
+    if not ranked_chunks:
+        return [], 0
+    
+    # Keep every chunk whose running token total stays within the budget
+    chunk_tokens = np.fromiter((estimate_tokens(chunk) for chunk in ranked_chunks), dtype=np.int64, count=len(ranked_chunks))
+    cumulative_tokens = np.cumsum(chunk_tokens)
+    cutoff = int(np.searchsorted(cumulative_tokens, max_tokens, side='right'))
+    relevant_chunks = ranked_chunks[:cutoff]
+    total_tokens = int(cumulative_tokens[cutoff - 1]) if cutoff else 0
+    
+    # Fill the remaining budget with the start of the next chunk
+    if cutoff < len(ranked_chunks):
+        chars_to_keep = (max_tokens - total_tokens) * 4
+        truncated_chunk = ranked_chunks[cutoff][:chars_to_keep]
+        if truncated_chunk:
+            relevant_chunks.append(truncated_chunk)
+    return relevant_chunks, total_tokens
+
+@lru_cache(maxsize=32)
+def load_vector_index(filename):
+    """Load a document's FAISS index and chunks, keeping recent ones in memory."""
+    import faiss
+    
+    vector_db_path, chunks_path, offsets_path = get_index_paths(filename)
+    index = faiss.read_index(vector_db_path)
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index, ChunkStore.load(chunks_path, offsets_path)
+
+def encode_query(query):
+    """Encode a query into a normalized embedding, caching repeated queries."""
+    # The embedding model is uncased and ignores spacing, so questions that differ
+    # only in case or whitespace share one cached embedding
+    return encode_normalized_query(' '.join(query.lower().split()))
+
+@lru_cache(maxsize=256)
+def encode_normalized_query(query):
+    """Encode a lowercased, whitespace-collapsed query"""
+    return get_embedding_model().encode(
+        query,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    ).astype('float32')
+
 def retrieve_relevant_chunks(query, filename, max_tokens=1500, top_k=3):
     """Retrieve top-k relevant chunks from FAISS index."""
-    vector_db_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{filename}.faiss")
-    chunks_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{filename}_chunks.pkl")
-    
-    if not os.path.exists(vector_db_path) or not os.path.exists(chunks_path):
+    if not index_files_exist(filename):
         logger.error(f"Vector DB or chunks not found for {filename}")
         return []
     
-    index = faiss.read_index(vector_db_path)
-    with open(chunks_path, 'rb') as f:
-        chunks = pickle.load(f)
+    index, chunks = load_vector_index(filename)
         
     # Check if index has any vectors
     if index.ntotal == 0:
@@ -191,31 +520,114 @@ def retrieve_relevant_chunks(query, filename, max_tokens=1500, top_k=3):
         return []
         
     # Encode query and reshape to 2D array
-    query_embedding = embedding_model.encode(query, convert_to_tensor=False).astype('float32')
-    query_embedding = query_embedding.reshape(1, -1)  # Reshape to (1, embedding_dim)
-    
-    distances, indices = index.search(query_embedding, top_k)
-    
-    relevant_chunks = []
-    total_tokens = 0
-    for idx in indices[0]:
-        if idx < len(chunks):
-            chunk = chunks[idx]
-            chunk_tokens = estimate_tokens(chunk)
-            if total_tokens + chunk_tokens <= max_tokens:
-                relevant_chunks.append(chunk)
-                total_tokens += chunk_tokens
-            else:
-                remaining_tokens = max_tokens - total_tokens
-                chars_to_keep = remaining_tokens * 4
-                truncated_chunk = chunk[:chars_to_keep]
-                if truncated_chunk:
-                    relevant_chunks.append(truncated_chunk)
-                break
+    query_embedding = encode_query(query).reshape(1, -1)  # Reshape to (1, embedding_dim)
     
-    logger.debug(f"Retrieved {len(relevant_chunks)} chunks for query '{query}', total tokens: {total_tokens}, distances: {distances[0].tolist()}")
+    scores, indices = index.search(query_embedding, top_k)
+    relevant_chunks, total_tokens = select_chunks_within_budget(indices[0], chunks, max_tokens)
+    
+    logger.debug(f"Retrieved {len(relevant_chunks)} chunks for query '{query}', total tokens: {total_tokens}, scores: {scores[0].tolist()}")
     return relevant_chunks
 
+def retrieve_relevant_chunks_batch(queries, filename, max_tokens=1500, top_k=3):
+    """Retrieve top-k relevant chunks for several queries with one encode and one search."""
+    if not index_files_exist(filename):
+        logger.error(f"Vector DB or chunks not found for {filename}")
+        return [[] for _ in queries]
+    
+    index, chunks = load_vector_index(filename)
+    
+    if index.ntotal == 0:
+        logger.error(f"FAISS index is empty for {filename}")
+        return [[] for _ in queries]
+    
+    query_embeddings = get_embedding_model().encode(
+        queries,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    ).astype('float32')
+    
+    scores, indices = index.search(query_embeddings, top_k)
+    
+    results = []
+    for query, chunk_ids in zip(queries, indices):
+        relevant_chunks, total_tokens = select_chunks_within_budget(chunk_ids, chunks, max_tokens)
+        logger.debug(f"Retrieved {len(relevant_chunks)} chunks for query '{query}', total tokens: {total_tokens}")
+        results.append(relevant_chunks)
+    return results
+
+class SemanticAnswerCache:
+    """Earlier answers per document, looked up by query embedding similarity"""
+    
+    def __init__(self, max_documents=256, max_answers=SEMANTIC_CACHE_MAX_ANSWERS, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.max_answers = max_answers
+        self.threshold = threshold
+        # Each key maps to an inner-product index over normalized query embeddings
+        # and the answers stored in the same order
+        self._entries = LRUCache(maxsize=max_documents)
+        self._lock = threading.Lock()
+    
+    def get(self, key, query_embedding):
+        """Return the answer to the most similar earlier query, or None below the threshold"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            index, answers = entry
+            scores, ids = index.search(query_embedding.reshape(1, -1), 1)
+        if scores[0][0] < self.threshold:
+            return None
+        return answers[ids[0][0]]
+    
+    def put(self, key, query_embedding, answer):
+        """Remember an answer; once a document holds max_answers, new ones are not stored"""
+        import faiss
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = (faiss.IndexFlatIP(query_embedding.shape[0]), [])
+                self._entries.put(key, entry)
+            index, answers = entry
+            if index.ntotal < self.max_answers:
+                index.add(query_embedding.reshape(1, -1))
+                answers.append(answer)
+
+semantic_answer_cache = SemanticAnswerCache()
+
+# Patterns used on every query, compiled once at import
+RATE_LIMIT_RE = re.compile(r'Please try again in ([\d.]+)s')
+DURATION_RE = re.compile(r'(\d+)\s*(year|years|month|months|day|days)')
+
+def compile_keyword_regex(keywords):
+    """Compile keywords into one alternation that matches any of them as a substring."""
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+
+# Keywords that show a question is about each category (QUERY_KEYWORDS), and that an
+# extracted item actually covers that category (KEYWORDS)
+QUERY_KEYWORDS = {
+    "duration": ("duration", "period", "term", "policy term", "policy period", "length", "how long"),
+    "coverage": ("coverage", "covered", "protection", "benefits"),
+    "exclusions": ("exclusion", "excluded", "not covered"),
+    "claims": ("claim", "file a claim", "claims process", "how to claim"),
+    "premium": ("premium", "cost", "price", "payment", "fee"),
+    "terms": ("terms", "conditions", "terms and conditions"),
+    "definitions": ("definition", "define", "meaning"),
+}
+KEYWORDS = {
+    "duration": ("duration", "period", "term", "policy term", "policy period"),
+    "coverage": ("coverage", "covered", "benefits", "included"),
+    "exclusions": ("exclusion", "excluded", "not covered", "limitation"),
+    "claims": ("claim", "claims", "file", "process", "procedure"),
+    "premium": ("premium", "cost", "price", "payment", "fee"),
+    "terms": ("terms", "conditions", "provision", "clause"),
+    "definitions": ("definition", "defined as", "means", "refers to"),
+}
+
+QUERY_KEYWORD_RE = {category: compile_keyword_regex(keywords) for category, keywords in QUERY_KEYWORDS.items()}
+KEYWORD_RE = {category: compile_keyword_regex(keywords) for category, keywords in KEYWORDS.items()}
+
 def retry_with_backoff(func, max_retries=3, base_delay=1):
     """Retry a function with exponential backoff."""
     @wraps(func)
@@ -226,7 +638,7 @@ def retry_with_backoff(func, max_retries=3, base_delay=1):
             except Exception as e:
                 if 'rate_limit_exceeded' in str(e) and attempt < max_retries - 1:
                     retry_time = 10
-                    match = re.search(r'Please try again in ([\d.]+)s', str(e))
+                    match = RATE_LIMIT_RE.search(str(e))
                     if match:
                         retry_time = float(match.group(1))
                     delay = base_delay * (2 ** attempt) + retry_time
@@ -245,10 +657,7 @@ def try_structured_extraction(query, analysis, document_type, query_type):
         query_lower = query.lower()
         
         # Duration queries - only check relevant sections
-        if query_type == "duration" or any(keyword in query_lower for keyword in ["duration", "period", "term", "policy term", "policy period", "length", "how long"]):
-            # Define duration pattern to look for actual time periods
-            duration_pattern = r'(\d+)\s*(year|years|month|months|day|days)'
-            
+        if query_type == "duration" or QUERY_KEYWORD_RE["duration"].search(query_lower):
             # Only check sections that are likely to contain duration information
             duration_sections = [
                 ("key_terms", analysis.get("key_terms", [])),
@@ -260,9 +669,9 @@ def try_structured_extraction(query, analysis, document_type, query_type):
                 for term in section_content:
                     term_lower = term.lower()
                     # Check if the term contains duration keywords AND has a duration pattern
-                    if any(keyword in term_lower for keyword in ["duration", "period", "term", "policy term", "policy period"]):
+                    if KEYWORD_RE["duration"].search(term_lower):
                         # Look for actual duration values
-                        match = re.search(duration_pattern, term_lower)
+                        match = DURATION_RE.search(term_lower)
                         if match:
                             logger.debug(f"Found duration with pattern in {section_name}: {term}")
                             return {"answer": term, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
@@ -271,78 +680,131 @@ def try_structured_extraction(query, analysis, document_type, query_type):
             for section_name, section_content in duration_sections:
                 for term in section_content:
                     term_lower = term.lower()
-                    if any(keyword in term_lower for keyword in ["duration", "period", "term", "policy term", "policy period"]):
+                    if KEYWORD_RE["duration"].search(term_lower):
                         logger.debug(f"Found duration keyword in {section_name} (without pattern): {term}")
                         return {"answer": term, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
         
         # Coverage queries - only check coverage section
-        elif query_type == "coverage" or any(keyword in query_lower for keyword in ["coverage", "covered", "protection", "benefits"]):
+        elif query_type == "coverage" or QUERY_KEYWORD_RE["coverage"].search(query_lower):
             coverage_details = analysis.get("coverage_details", [])
             if coverage_details:
                 # Look for terms that actually mention coverage
                 for detail in coverage_details:
                     detail_lower = detail.lower()
-                    if any(keyword in detail_lower for keyword in ["coverage", "covered", "benefits", "included"]):
+                    if KEYWORD_RE["coverage"].search(detail_lower):
                         logger.debug(f"Found relevant coverage detail: {detail}")
                         return {"answer": detail, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
         
         # Exclusion queries - only check exclusions section
-        elif query_type == "exclusions" or any(keyword in query_lower for keyword in ["exclusion", "excluded", "not covered"]):
+        elif query_type == "exclusions" or QUERY_KEYWORD_RE["exclusions"].search(query_lower):
             exclusions = analysis.get("exclusions", [])
             if exclusions:
                 # Look for terms that actually mention exclusions
                 for exclusion in exclusions:
                     exclusion_lower = exclusion.lower()
-                    if any(keyword in exclusion_lower for keyword in ["exclusion", "excluded", "not covered", "limitation"]):
+                    if KEYWORD_RE["exclusions"].search(exclusion_lower):
                         logger.debug(f"Found relevant exclusion: {exclusion}")
                         return {"answer": exclusion, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
         
         # Claims process queries - only check claims section
-        elif query_type == "claims" or any(keyword in query_lower for keyword in ["claim", "file a claim", "claims process", "how to claim"]):
+        elif query_type == "claims" or QUERY_KEYWORD_RE["claims"].search(query_lower):
             claims_process = analysis.get("claims_process", [])
             if claims_process:
                 # Look for terms that actually mention claims
                 for claim in claims_process:
                     claim_lower = claim.lower()
-                    if any(keyword in claim_lower for keyword in ["claim", "claims", "file", "process", "procedure"]):
+                    if KEYWORD_RE["claims"].search(claim_lower):
                         logger.debug(f"Found relevant claims process: {claim}")
                         return {"answer": claim, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
         
         # Premium queries - only check premium section
-        elif query_type == "premium" or any(keyword in query_lower for keyword in ["premium", "cost", "price", "payment", "fee"]):
+        elif query_type == "premium" or QUERY_KEYWORD_RE["premium"].search(query_lower):
             premium_info = analysis.get("premium_info", [])
             if premium_info:
                 # Look for terms that actually mention premium
                 premium_lower = premium_info.lower()
-                if any(keyword in premium_lower for keyword in ["premium", "cost", "price", "payment", "fee"]):
+                if KEYWORD_RE["premium"].search(premium_lower):
                     logger.debug(f"Found relevant premium info: {premium_info}")
                     return {"answer": premium_info, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
         
         # Terms & Conditions queries - only check terms section
-        elif query_type == "terms" or any(keyword in query_lower for keyword in ["terms", "conditions", "terms and conditions"]):
+        elif query_type == "terms" or QUERY_KEYWORD_RE["terms"].search(query_lower):
             terms_conditions = analysis.get("terms_conditions", [])
             if terms_conditions:
                 # Look for terms that actually mention terms and conditions
                 for term in terms_conditions:
                     term_lower = term.lower()
-                    if any(keyword in term_lower for keyword in ["terms", "conditions", "provision", "clause"]):
+                    if KEYWORD_RE["terms"].search(term_lower):
                         logger.debug(f"Found relevant terms and conditions: {term}")
                         return {"answer": term, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
         
         # Definitions queries - only check definitions section
-        elif query_type == "definitions" or any(keyword in query_lower for keyword in ["definition", "define", "meaning"]):
+        elif query_type == "definitions" or QUERY_KEYWORD_RE["definitions"].search(query_lower):
             definitions = analysis.get("definitions", [])
             if definitions:
                 # Look for terms that actually contain definitions
                 for definition in definitions:
                     definition_lower = definition.lower()
-                    if any(keyword in definition_lower for keyword in ["definition", "defined as", "means", "refers to"]):
+                    if KEYWORD_RE["definitions"].search(definition_lower):
                         logger.debug(f"Found relevant definition: {definition}")
                         return {"answer": definition, "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
     
     logger.debug("No structured answer found, falling back to RAG")
     return None
 
+def get_document_hash(document_text):
+    """Hash document text to identify its cached analysis and vector index."""
+    return hashlib.blake2b(document_text.encode('utf-8'), digest_size=16).hexdigest()
+
+def analyze_document_cached(document_text, doc_hash, persist=True):
+    """Run the simple and detailed analyses, reusing results stored for the same text.
+    
+    With persist=False a newly computed result is only kept in memory, for texts that
+    are not uploaded documents.
+    """
+    cached = analysis_cache.get(doc_hash)
+    if cached is not None:
+        return cached
+    
+    analysis_path = os.path.join(app.config['VECTOR_DB_PATH'], f"{doc_hash}_analysis_v{ANALYSIS_CACHE_VERSION}.json")
+    if os.path.exists(analysis_path):
+        with open(analysis_path, 'rb') as f:
+            cached = orjson.loads(f.read())
+        logger.debug(f"Loaded cached analysis for {doc_hash}")
+        result = cached['simple_analysis'], cached['detailed_analysis']
+        analysis_cache.put(doc_hash, result)
+        return result
+    
+    detailed_analysis = document_analyzer.analyze_document(document_text)
+    simple_analysis = analyze_document_content(document_text)
+    
+    # If detailed analysis classified as Resume/CV but simple analysis says Insurance Policy,
+    # override the document type in detailed_analysis
+    if detailed_analysis.get('document_type') == 'Resume/CV' and simple_analysis.get('document_type') == 'Insurance Policy':
+        detailed_analysis['document_type'] = 'Insurance Policy'
+        logger.debug("Overrode document type from Resume/CV to Insurance Policy")
+    
+    if persist:
+        write_json_atomic(analysis_path, {'simple_analysis': simple_analysis, 'detailed_analysis': detailed_analysis})
+    result = simple_analysis, detailed_analysis
+    analysis_cache.put(doc_hash, result)
+    return result
+
+# Concurrent requests for the same document (such as a repeated hackrx URL) wait for one
+# build instead of each embedding it; a hash maps to one of a fixed set of locks. Across
+# worker processes builds can still overlap, which the atomic writes make safe
+INDEX_BUILD_LOCKS = [threading.Lock() for _ in range(64)]
+
+def ensure_vector_index(document_text, doc_hash):
+    """Build the vector index for a document unless one already exists for its hash."""
+    with INDEX_BUILD_LOCKS[int(doc_hash[:8], 16) % len(INDEX_BUILD_LOCKS)]:
+        if index_files_exist(doc_hash):
+            logger.debug(f"Reusing vector index for {doc_hash}")
+        else:
+            create_vector_index(split_document(document_text), doc_hash)
+    vector_db_path, chunks_path, _ = get_index_paths(doc_hash)
+    return vector_db_path, chunks_path
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -361,23 +823,18 @@ def upload_file():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = timestamp + "_" + filename
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        document_text = process_document(file_path)
-        chunks = split_document(document_text)
-        vector_db_path, chunks_path = create_vector_index(chunks, filename)
-        
-        # Get detailed analysis from document_analyzer
-        detailed_analysis = document_analyzer.analyze_document(document_text)
+        file_hash = save_upload(file, file_path)
         
-        # Get simple analysis with improved document type detection
-        simple_analysis = analyze_document_content(document_text)
+        # Re-uploads of the same file skip text extraction entirely
+        document_text = process_document_cached(file_path, file_hash)
         
-        # If detailed analysis classified as Resume/CV but simple analysis says Insurance Policy,
-        # override the document type in detailed_analysis
-        if detailed_analysis.get('document_type') == 'Resume/CV' and simple_analysis.get('document_type') == 'Insurance Policy':
-            detailed_analysis['document_type'] = 'Insurance Policy'
-            logger.debug("Overrode document type from Resume/CV to Insurance Policy")
+        # Identical documents share one vector index and analysis. Embedding runs in
+        # torch, which releases the GIL, so it overlaps with the pure-Python analysis
+        doc_hash = get_document_hash(document_text)
+        store_document_text(doc_hash, document_text)
+        index_future = background_executor.submit(ensure_vector_index, document_text, doc_hash)
+        simple_analysis, detailed_analysis = analyze_document_cached(document_text, doc_hash)
+        vector_db_path, chunks_path = index_future.result()
         
         logger.debug(f"Detailed analysis: {detailed_analysis}")
         logger.debug(f"Simple analysis: {simple_analysis}")
@@ -385,11 +842,11 @@ def upload_file():
         document_info = {
             'filename': filename,
             'original_name': file.filename,
-            'text': document_text,
             'upload_time': datetime.now().isoformat(),
             'file_size': os.path.getsize(file_path),
             'analysis': simple_analysis,
             'detailed_analysis': detailed_analysis,
+            'index_id': doc_hash,
             'vector_db_path': vector_db_path,
             'chunks_path': chunks_path
         }
@@ -402,33 +859,65 @@ def upload_file():
     
     return jsonify({'error': 'Invalid file type'}), 400
 
+def query_response(result, stream):
+    """Send a finished answer as JSON, or as plain text to clients that asked for a stream"""
+    if stream:
+        return Response(result['answer'], mimetype='text/plain')
+    return jsonify(result)
+
 @app.route('/query', methods=['POST'])
 @retry_with_backoff
 def process_query():
     data = request.get_json()
     query = data.get('query', '')
-    document_text = data.get('document_text', '')
     query_type = data.get('query_type', 'general')
-    detailed_analysis = data.get('detailed_analysis', {})
-    filename = data.get('filename', '')
+    index_id = data.get('index_id', '')
+    # Streamed answers are sent as plain text while the model generates them
+    stream = bool(data.get('stream', False))
     
     if not query:
         return jsonify({'error': 'No query provided'}), 400
     
-    if not document_text or not filename:
-        return jsonify({'error': 'No document text or filename provided'}), 400
+    if not index_id:
+        return jsonify({'error': 'No index id provided'}), 400
+    
+    document_text = load_document_text(index_id)
+    if document_text is None:
+        return jsonify({'error': 'Document not found, please upload it again'}), 404
+    
+    # The analysis of an uploaded document is already cached under its index id
+    _, detailed_analysis = analyze_document_cached(document_text, index_id)
     
     # Try structured extraction first
     document_type = detailed_analysis.get('document_type', 'General Document')
     result = try_structured_extraction(query, detailed_analysis, document_type, query_type)
     if result:
         logger.debug(f"Structured extraction succeeded for query: {query}")
-        return jsonify(result)
+        return query_response(result, stream)
     
-    # Fall back to RAG if structured extraction fails
-    relevant_chunks = retrieve_relevant_chunks(query, filename, max_tokens=1500, top_k=3)
+    # Reuse the answer to an earlier question about this document that means the same
+    query_embedding = encode_query(query)
+    cache_key = (index_id, query_type)
+    result = semantic_answer_cache.get(cache_key, query_embedding)
+    if result is not None:
+        logger.debug(f"Semantic cache hit for query: {query}")
+        return query_response(result, stream)
+    
+    # Fall back to RAG if structured extraction fails; the index normally exists since
+    # upload, but is rebuilt from the saved text if its files are missing
+    ensure_vector_index(document_text, index_id)
+    relevant_chunks = retrieve_relevant_chunks(query, index_id, max_tokens=1500, top_k=3)
     context = "\n".join(relevant_chunks)
+    if stream:
+        # The first words reach the client as soon as Groq produces them. The request is
+        # already open when query_document returns, so its errors are raised (and rate
+        # limits retried) before any response is sent
+        logger.debug(f"RAG pipeline streaming answer for query: {query}")
+        answer_chunks = groq_client.query_document(query, context, query_type, stream=True)
+        return Response(stream_with_context(answer_chunks), mimetype='text/plain')
+    
     result = groq_client.query_document(query, context, query_type)
+    semantic_answer_cache.put(cache_key, query_embedding, result)
     
     logger.debug(f"RAG pipeline used, tokens: {result['token_usage']['total_tokens']}")
     return jsonify(result)
@@ -436,19 +925,23 @@ def process_query():
 @app.route('/analyze', methods=['POST'])
 def analyze_document():
     data = request.get_json()
-    document_text = data.get('document_text', '')
+    index_id = data.get('index_id', '')
     
-    if not document_text:
-        return jsonify({'error': 'No document text provided'}), 400
-    
-    simple_analysis = analyze_document_content(document_text)
-    detailed_analysis = document_analyzer.analyze_document(document_text)
+    if index_id:
+        document_text = load_document_text(index_id)
+        if document_text is None:
+            return jsonify({'error': 'Document not found, please upload it again'}), 404
+        persist = True
+    else:
+        document_text = data.get('document_text', '')
+        if not document_text:
+            return jsonify({'error': 'No document text provided'}), 400
+        index_id = get_document_hash(document_text)
+        # Arbitrary posted texts would leave one file each on disk, so only the
+        # in-memory cache (bounded by its size) keeps their analyses
+        persist = False
     
-    # If detailed analysis classified as Resume/CV but simple analysis says Insurance Policy,
-    # override the document type in detailed_analysis
-    if detailed_analysis.get('document_type') == 'Resume/CV' and simple_analysis.get('document_type') == 'Insurance Policy':
-        detailed_analysis['document_type'] = 'Insurance Policy'
-        logger.debug("Overrode document type from Resume/CV to Insurance Policy")
+    simple_analysis, detailed_analysis = analyze_document_cached(document_text, index_id, persist=persist)
     
     return jsonify({
         'simple_analysis': simple_analysis,
@@ -474,44 +967,48 @@ def hackrx_run():
         return jsonify({"error": "Missing documents or questions"}), 400
     
     try:
-        response = requests.get(document_url)
-        if response.status_code != 200:
-            return jsonify({"error": "Unable to fetch document"}), 400
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_temp_doc.pdf"
-        temp_filename = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        with open(temp_filename, 'wb') as f:
-            f.write(response.content)
-        
-        document_text = extract_text_from_pdf(temp_filename)
-        chunks = split_document(document_text)
-        create_vector_index(chunks, filename)
+        # Download in blocks, enforcing the same size limit as uploads, and parse the
+        # PDF from memory; the index is keyed by content hash so no file is needed
+        blocks = []
+        downloaded = 0
+        with download_session.get(document_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            if response.status_code != 200:
+                return jsonify({"error": "Unable to fetch document"}), 400
+            for block in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                downloaded += len(block)
+                if downloaded > app.config['MAX_CONTENT_LENGTH']:
+                    return jsonify({"error": "Document is too large"}), 400
+                blocks.append(block)
         
-        detailed_analysis = document_analyzer.analyze_document(document_text)
+        document_text = extract_text_from_pdf_bytes(b"".join(blocks))
         
-        # If detailed analysis classified as Resume/CV but simple analysis says Insurance Policy,
-        # override the document type in detailed_analysis
-        simple_analysis = analyze_document_content(document_text)
-        if detailed_analysis.get('document_type') == 'Resume/CV' and simple_analysis.get('document_type') == 'Insurance Policy':
-            detailed_analysis['document_type'] = 'Insurance Policy'
-            logger.debug("Overrode document type from Resume/CV to Insurance Policy")
+        # The same document URL is often sent repeatedly, so reuse its analysis
+        doc_hash = get_document_hash(document_text)
+        _, detailed_analysis = analyze_document_cached(document_text, doc_hash)
         
-        answers = []
-        for question in questions:
+        answers = [None] * len(questions)
+        rag_positions = []
+        document_type = detailed_analysis.get('document_type', 'General Document')
+        for position, question in enumerate(questions):
             # Try structured extraction first
-            document_type = detailed_analysis.get('document_type', 'General Document')
             result = try_structured_extraction(question, detailed_analysis, document_type, "hackathon")
             if result:
-                answers.append(result["answer"])
-                continue
+                answers[position] = result["answer"]
+            else:
+                rag_positions.append(position)
+        
+        # Fall back to RAG for the remaining questions, retrieving all of them in one batch
+        if rag_positions:
+            # Embedding is only needed once a question falls through to RAG
+            ensure_vector_index(document_text, doc_hash)
+            rag_questions = [questions[position] for position in rag_positions]
+            rag_chunks = retrieve_relevant_chunks_batch(rag_questions, doc_hash, max_tokens=1500, top_k=3)
+            rag_contexts = ["\n".join(relevant_chunks) for relevant_chunks in rag_chunks]
             
-            # Fall back to RAG if structured extraction fails
-            relevant_chunks = retrieve_relevant_chunks(question, filename, max_tokens=1500, top_k=3)
-            context = "\n".join(relevant_chunks)
-            result = groq_client.query_document(question, context, query_type="hackathon")
-            answer = result.get("answer", "No answer returned")
-            answers.append(answer)
+            # Groq calls are network-bound, so they run concurrently on the shared pool
+            results = groq_client.query_many(rag_questions, rag_contexts, query_type="hackathon")
+            for position, result in zip(rag_positions, results):
+                answers[position] = result.get("answer", "No answer returned")
         
         return jsonify({"answers": answers})
     except Exception as e:
@@ -1,8 +1,118 @@
 import re
 import json
-from typing import Dict, List, Optional
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from datetime import datetime
 
+class KeywordScanner:
+    """Finds which of a fixed set of keywords occur in a text with a single regex pass"""
+    
+    def __init__(self, keywords: Iterable[str]):
+        # Keywords are matched case-sensitively against text the caller has already
+        # lowercased; a caseless regex would compare every character case-folded
+        self.keywords = frozenset(keyword.lower() for keyword in keywords)
+        # Longest keywords first so each position reports its longest match; the lookahead
+        # lets matches overlap, so keywords inside other keywords are found as well
+        alternation = '|'.join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True))
+        self._pattern = re.compile('(?=(' + alternation + '))')
+        # Shorter keywords that start the reported match also occur at that position
+        self._prefixes = {
+            keyword: frozenset(other for other in self.keywords if keyword.startswith(other))
+            for keyword in self.keywords
+        }
+    
+    def scan(self, text_lower: str) -> Set[str]:
+        """Return the set of keywords that occur anywhere in the lowercased text"""
+        found = set()
+        for match in self._pattern.finditer(text_lower):
+            hit = match.group(1)
+            if hit not in found:
+                found |= self._prefixes[hit]
+                # Once every keyword has been seen the rest of the text cannot add any
+                if len(found) == len(self.keywords):
+                    break
+        return found
+    
+    def finditer(self, text_lower: str) -> Iterator[Tuple[int, str]]:
+        """Yield (position, keyword) for every keyword occurrence in the lowercased text, in order"""
+        for match in self._pattern.finditer(text_lower):
+            start = match.start()
+            for keyword in self._prefixes[match.group(1)]:
+                yield start, keyword
+
+# Insurance policy indicators used by _detect_document_type
+INSURANCE_KEYWORDS = (
+    'insurance', 'policy', 'coverage', 'premium', 'claim', 'benefits', 'exclusions',
+    'policy period', 'sum insured', 'policyholder', 'insured', 'waiting period',
+    'grace period', 'cumulative bonus', 'portability', 'renewal', 'deductible'
+)
+
+# Policy types checked in order by _extract_policy_type, and the section names
+# _identify_policy_sections reports, in report order
+POLICY_TYPES = ('health', 'life', 'auto', 'home', 'property', 'liability')
+POLICY_SECTION_KEYWORDS = ('coverage', 'exclusions', 'claims', 'premium', 'terms', 'conditions', 'definitions')
+
+# One scanner for all three keyword tables, so analyze_document reads the text once
+# and every keyword check after that is a set lookup
+DOCUMENT_KEYWORD_SCANNER = KeywordScanner(INSURANCE_KEYWORDS + POLICY_TYPES + POLICY_SECTION_KEYWORDS)
+INSURANCE_KEYWORD_SET = frozenset(INSURANCE_KEYWORDS)
+
+# Header keywords that open the sections read by the insurance policy extractors
+COVERAGE_HEADERS = ('coverage', 'benefits', 'what is covered')
+EXCLUSION_HEADERS = ('exclusions', 'what is not covered', 'limitations')
+CLAIMS_HEADERS = ('claims', 'claim process', 'filing claims')
+PREMIUM_HEADERS = ('premium', 'payment', 'cost')
+KEY_TERMS_HEADERS = ('terms', 'conditions', 'provisions', 'key terms')
+TERMS_CONDITIONS_HEADERS = ('terms and conditions', 'terms & conditions', 'policy terms')
+DEFINITIONS_HEADERS = ('definitions', 'defined terms')
+# Document lines and the line numbers each header keyword appears on
+SectionIndex = Tuple[List[str], Dict[str, List[int]]]
+SECTION_HEADER_SCANNER = KeywordScanner(
+    COVERAGE_HEADERS + EXCLUSION_HEADERS + CLAIMS_HEADERS + PREMIUM_HEADERS +
+    KEY_TERMS_HEADERS + TERMS_CONDITIONS_HEADERS + DEFINITIONS_HEADERS
+)
+
+# Duration-related wording that key terms and definitions are prioritized by; "term"
+# and "period" also cover "policy term" and "policy period"
+DURATION_TERM_RE = re.compile(r'duration|period|term', re.IGNORECASE | re.ASCII)
+
+def combining_mark_ranges() -> str:
+    """Character class ranges covering the combining marks of the Basic Multilingual Plane"""
+    ranges = []
+    for code in range(0x10000):
+        if unicodedata.category(chr(code)).startswith('M'):
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    return ''.join('\\u%04x-\\u%04x' % (start, end) for start, end in ranges)
+
+# Key topic words: runs of five or more letters, so punctuation and digits next to a
+# word never hide it ("coverage," counts as "coverage")
+TOPIC_WORD_RE = re.compile(r'[^\W\d_]{5,}')
+
+# Combining marks are not word characters to re, so a decomposed accent (or the dot
+# that "İ".lower() adds) would split a word into fragments. Texts containing any marks
+# use the slower pattern that keeps them inside words
+COMBINING_MARKS = combining_mark_ranges()
+COMBINING_MARK_RE = re.compile('[' + COMBINING_MARKS + ']')
+TOPIC_WORD_WITH_MARKS_RE = re.compile(r'[^\W\d_](?:[^\W\d_]|[' + COMBINING_MARKS + ']){4,}')
+
+# Numeric (d/m/y and y-m-d) and written-out dates, found in one pass by _extract_dates.
+# DATE_RE runs on lowercased text; the caseless copy is for texts whose lowercase
+# form has a different length, where match positions would not line up
+DATE_PATTERN = (
+    r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b'
+    r'|\b\d{4}[/-]\d{1,2}[/-]\d{1,2}\b'
+    r'|\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{1,2},?\s+\d{4}\b'
+)
+DATE_RE = re.compile(DATE_PATTERN)
+DATE_CASELESS_RE = re.compile(DATE_PATTERN, re.IGNORECASE)
+
+# Longest prefix of a document that analyze_document extracts information from
+MAX_ANALYSIS_CHARS = 1000000
+
 class DocumentAnalyzer:
     """Intelligent document analyzer that extracts information from insurance policies"""
     
@@ -16,28 +126,30 @@ class DocumentAnalyzer:
         if not text:
             return {"error": "No text content found"}
         
-        # Determine document type
-        self.document_type = self._detect_document_type(text)
+        # Extraction reads at most the first MAX_ANALYSIS_CHARS characters so very large
+        # texts take bounded time; word and page counts still cover the whole text
+        full_text = text
+        text = text[:MAX_ANALYSIS_CHARS]
         
-        # Extract information based on document type
-        if self.document_type == "insurance_policy":
-            return self._analyze_insurance_policy(text)
-        else:
-            return self._analyze_general_document(text)
-    
-    def _detect_document_type(self, text: str) -> str:
-        """Detect the type of document based on content"""
+        # Find the document, policy type and section keywords in a single pass
         text_lower = text.lower()
+        found_keywords = DOCUMENT_KEYWORD_SCANNER.scan(text_lower)
         
-        # Insurance policy indicators
-        insurance_keywords = [
-            'insurance', 'policy', 'coverage', 'premium', 'claim', 'benefits', 'exclusions',
-            'policy period', 'sum insured', 'policyholder', 'insured', 'waiting period',
-            'grace period', 'cumulative bonus', 'portability', 'renewal', 'deductible'
-        ]
+        # Determine document type. One analyzer serves concurrent requests, so the
+        # branch reads a local; self.document_type only records the latest result
+        document_type = self._detect_document_type(found_keywords)
+        self.document_type = document_type
         
+        # Extract information based on document type
+        if document_type == "insurance_policy":
+            return self._analyze_insurance_policy(text, text_lower, found_keywords)
+        else:
+            return self._analyze_general_document(text, text_lower, full_text)
+    
+    def _detect_document_type(self, found_keywords: Set[str]) -> str:
+        """Detect the type of document from the keywords found in it"""
         # Count how many insurance keywords appear in the document
-        insurance_keyword_count = sum(1 for keyword in insurance_keywords if keyword in text_lower)
+        insurance_keyword_count = len(INSURANCE_KEYWORD_SET & found_keywords)
         
         # If we have at least 3 insurance keywords, classify as insurance policy
         if insurance_keyword_count >= 3:
@@ -45,255 +157,201 @@ class DocumentAnalyzer:
         
         return "general_document"
     
-    def _analyze_insurance_policy(self, text: str) -> Dict:
+    def _analyze_insurance_policy(self, text: str, text_lower: str, found_keywords: Set[str]) -> Dict:
         """Extract information from insurance policy"""
+        # Index the section headers once and share it between the extractors
+        sections = self._index_sections(text, text_lower)
         info = {
             "document_type": "Insurance Policy",
-            "policy_type": self._extract_policy_type(text),
-            "coverage_details": self._extract_coverage_details(text),
-            "exclusions": self._extract_exclusions(text),
-            "claims_process": self._extract_claims_process(text),
-            "premium_info": self._extract_premium_info(text),
-            "key_terms": self._extract_key_terms(text),
-            "terms_conditions": self._extract_terms_conditions(text),
-            "definitions": self._extract_definitions(text),
-            "key_sections": self._identify_policy_sections(text)
+            "policy_type": self._extract_policy_type(found_keywords),
+            "coverage_details": self._extract_coverage_details(sections),
+            "exclusions": self._extract_exclusions(sections),
+            "claims_process": self._extract_claims_process(sections),
+            "premium_info": self._extract_premium_info(sections),
+            "key_terms": self._extract_key_terms(sections),
+            "terms_conditions": self._extract_terms_conditions(sections),
+            "definitions": self._extract_definitions(sections),
+            "key_sections": self._identify_policy_sections(found_keywords)
         }
         
         return info
     
-    def _analyze_general_document(self, text: str) -> Dict:
+    def _analyze_general_document(self, text: str, text_lower: str, full_text: str) -> Dict:
         """Extract general information from any document"""
         info = {
             "document_type": "General Document",
-            "key_topics": self._extract_key_topics(text),
-            "important_dates": self._extract_dates(text),
+            "key_topics": self._extract_key_topics(text_lower),
+            "important_dates": self._extract_dates(text, text_lower),
             "key_entities": self._extract_entities(text),
             "summary": self._generate_summary(text),
-            "word_count": len(text.split()),
-            "estimated_pages": len(text) // 500
+            "word_count": len(full_text.split()),
+            "estimated_pages": len(full_text) // 500
         }
         
         return info
     
-    def _find_section(self, text: str, section_names: List[str]) -> str:
+    def _index_sections(self, text: str, text_lower: str) -> SectionIndex:
+        """Split a document into lines and map each header keyword to the lines containing it"""
+        headers = {}
+        # One scan over the whole text; line numbers are counted between consecutive hits
+        line_number = 0
+        position = 0
+        for start, name in SECTION_HEADER_SCANNER.finditer(text_lower):
+            line_number += text_lower.count('\n', position, start)
+            position = start
+            header_lines = headers.setdefault(name, [])
+            if not header_lines or header_lines[-1] != line_number:
+                header_lines.append(line_number)
+        return text.split('\n'), headers
+    
+    def _find_section(self, sections: SectionIndex, section_names: Iterable[str]) -> str:
         """Find a specific section in the document"""
-        lines = text.split('\n')
-        in_section = False
-        section_content = []
+        return '\n'.join(self._section_lines(sections, section_names))
+    
+    def _section_items(self, sections: SectionIndex, section_names: Iterable[str]) -> List[str]:
+        """Lines of a section long enough to be a detail, term or definition"""
+        return [line for line in self._section_lines(sections, section_names) if len(line) > 10]
+    
+    def _section_lines(self, sections: SectionIndex, section_names: Iterable[str]) -> List[str]:
+        """Collect the stripped lines of the first section opened by any of the given names"""
+        lines, headers = sections
+        header_lines = set()
+        for name in section_names:
+            header_lines.update(headers.get(name, ()))
+        if not header_lines:
+            return []
         
-        for line in lines:
-            line_lower = line.lower().strip()
-            
-            # Check if this line starts a new section
-            if any(name in line_lower for name in section_names):
-                in_section = True
+        section_content = []
+        # The section starts after the first line naming it; later header lines are skipped
+        for i in range(min(header_lines) + 1, len(lines)):
+            if i in header_lines:
                 continue
             
-            # If we're in the section, collect content
-            if in_section:
-                if line.strip() and len(line.strip()) > 2:
-                    section_content.append(line.strip())
-                else:
-                    # Empty line might indicate end of section
-                    if len(section_content) > 0:
-                        break
-        
-        return '\n'.join(section_content)
+            # Only lines inside a section are ever stripped
+            line = lines[i].strip()
+            if line and len(line) > 2:
+                section_content.append(line)
+            else:
+                # Empty line might indicate end of section
+                if len(section_content) > 0:
+                    break
+        
+        return section_content
     
-    def _extract_policy_type(self, text: str) -> str:
-        """Extract insurance policy type"""
-        policy_types = ['health', 'life', 'auto', 'home', 'property', 'liability']
-        text_lower = text.lower()
-        
-        for policy_type in policy_types:
-            if policy_type in text_lower:
+    def _extract_policy_type(self, found_keywords: Set[str]) -> str:
+        """Extract insurance policy type from the keywords found in the document"""
+        for policy_type in POLICY_TYPES:
+            if policy_type in found_keywords:
                 return policy_type.title() + " Insurance"
         
         return "Insurance Policy"
     
-    def _extract_coverage_details(self, text: str) -> List[str]:
+    def _extract_coverage_details(self, sections: SectionIndex) -> List[str]:
         """Extract coverage details from policy"""
-        coverage = []
-        coverage_section = self._find_section(text, ['coverage', 'benefits', 'what is covered'])
-        
-        if coverage_section:
-            lines = coverage_section.split('\n')
-            for line in lines:
-                if len(line.strip()) > 10:
-                    coverage.append(line.strip())
-        
-        return coverage[:5]
+        return self._section_items(sections, COVERAGE_HEADERS)[:5]
     
-    def _extract_exclusions(self, text: str) -> List[str]:
+    def _extract_exclusions(self, sections: SectionIndex) -> List[str]:
         """Extract exclusions from policy"""
-        exclusions = []
-        exclusion_section = self._find_section(text, ['exclusions', 'what is not covered', 'limitations'])
-        
-        if exclusion_section:
-            lines = exclusion_section.split('\n')
-            for line in lines:
-                if len(line.strip()) > 10:
-                    exclusions.append(line.strip())
-        
-        return exclusions[:5]
+        return self._section_items(sections, EXCLUSION_HEADERS)[:5]
     
-    def _extract_claims_process(self, text: str) -> List[str]:
+    def _extract_claims_process(self, sections: SectionIndex) -> List[str]:
         """Extract claims process information"""
-        claims = []
-        claims_section = self._find_section(text, ['claims', 'claim process', 'filing claims'])
-        
-        if claims_section:
-            lines = claims_section.split('\n')
-            for line in lines:
-                if len(line.strip()) > 10:
-                    claims.append(line.strip())
-        
-        return claims[:5]
+        return self._section_items(sections, CLAIMS_HEADERS)[:5]
     
-    def _extract_premium_info(self, text: str) -> str:
+    def _extract_premium_info(self, sections: SectionIndex) -> str:
         """Extract premium information"""
-        premium_section = self._find_section(text, ['premium', 'payment', 'cost'])
+        premium_section = self._find_section(sections, PREMIUM_HEADERS)
         if premium_section:
             return premium_section[:200] + "..." if len(premium_section) > 200 else premium_section
         return "Premium information not found"
     
-    def _extract_key_terms(self, text: str) -> List[str]:
+    def _extract_key_terms(self, sections: SectionIndex) -> List[str]:
         """Extract key terms from policy"""
-        terms = []
-        terms_section = self._find_section(text, ['terms', 'conditions', 'provisions', 'key terms'])
-        
-        if terms_section:
-            lines = terms_section.split('\n')
-            for line in lines:
-                if len(line.strip()) > 10:
-                    terms.append(line.strip())
-        
-        # Prioritize duration-related terms
-        duration_terms = []
-        for term in terms:
-            term_lower = term.lower()
-            if any(keyword in term_lower for keyword in ["duration", "period", "term", "policy term", "policy period"]):
-                duration_terms.append(term)
-        
-        if duration_terms:
-            return duration_terms[:5]
-        
-        return terms[:5]
+        return self._prioritize_duration(self._section_items(sections, KEY_TERMS_HEADERS))
     
-    def _extract_terms_conditions(self, text: str) -> List[str]:
+    def _extract_terms_conditions(self, sections: SectionIndex) -> List[str]:
         """Extract terms and conditions from policy"""
-        terms_conditions = []
-        terms_section = self._find_section(text, ['terms and conditions', 'terms & conditions', 'policy terms'])
-        
-        if terms_section:
-            lines = terms_section.split('\n')
-            for line in lines:
-                if len(line.strip()) > 10:
-                    terms_conditions.append(line.strip())
-        
-        # Prioritize duration-related terms
-        duration_terms = []
-        for term in terms_conditions:
-            term_lower = term.lower()
-            if any(keyword in term_lower for keyword in ["duration", "period", "term", "policy term", "policy period"]):
-                duration_terms.append(term)
-        
-        if duration_terms:
-            return duration_terms[:5]
-        
-        return terms_conditions[:5]
+        return self._prioritize_duration(self._section_items(sections, TERMS_CONDITIONS_HEADERS))
     
-    def _extract_definitions(self, text: str) -> List[str]:
+    def _extract_definitions(self, sections: SectionIndex) -> List[str]:
         """Extract definitions from policy"""
-        definitions = []
-        definitions_section = self._find_section(text, ['definitions', 'defined terms'])
-        
-        if definitions_section:
-            lines = definitions_section.split('\n')
-            for line in lines:
-                if len(line.strip()) > 10:
-                    definitions.append(line.strip())
-        
-        # Prioritize duration-related definitions
-        duration_definitions = []
-        for definition in definitions:
-            definition_lower = definition.lower()
-            if any(keyword in definition_lower for keyword in ["duration", "period", "term", "policy term", "policy period"]):
-                duration_definitions.append(definition)
-        
-        if duration_definitions:
-            return duration_definitions[:5]
-        
-        return definitions[:5]
+        return self._prioritize_duration(self._section_items(sections, DEFINITIONS_HEADERS))
     
-    def _identify_policy_sections(self, text: str) -> List[str]:
-        """Identify key sections in insurance policy"""
-        sections = []
-        section_keywords = ['coverage', 'exclusions', 'claims', 'premium', 'terms', 'conditions', 'definitions']
-        
-        for keyword in section_keywords:
-            if keyword in text.lower():
-                sections.append(keyword.title())
-        
-        return sections
+    def _prioritize_duration(self, items: List[str]) -> List[str]:
+        """Return the first five duration-related items, or the first five items if there are none"""
+        return [item for item in items if DURATION_TERM_RE.search(item)][:5] or items[:5]
     
-    def _extract_key_topics(self, text: str) -> List[str]:
-        """Extract key topics from general document"""
-        # Simple keyword extraction
-        words = text.lower().split()
-        word_freq = {}
-        
-        for word in words:
-            if len(word) > 4 and word.isalpha():
-                word_freq[word] = word_freq.get(word, 0) + 1
-        
-        # Get most frequent words
-        sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-        return [word for word, freq in sorted_words[:10]]
+    def _identify_policy_sections(self, found_keywords: Set[str]) -> List[str]:
+        """Identify key sections in insurance policy from the keywords found in it"""
+        return [keyword.title() for keyword in POLICY_SECTION_KEYWORDS if keyword in found_keywords]
+    
+    def _extract_key_topics(self, text_lower: str) -> List[str]:
+        """Extract key topics from the lowercased general document"""
+        # Simple keyword extraction; the regex finds and length-filters words in C
+        topic_word_re = TOPIC_WORD_RE
+        if not text_lower.isascii() and COMBINING_MARK_RE.search(text_lower):
+            topic_word_re = TOPIC_WORD_WITH_MARKS_RE
+        word_freq = Counter(topic_word_re.findall(text_lower))
+        
+        # Get most frequent words; most_common keeps a 10-item heap instead of sorting every word
+        return [word for word, freq in word_freq.most_common(10)]
     
-    def _extract_dates(self, text: str) -> List[str]:
+    def _extract_dates(self, text: str, text_lower: str) -> List[str]:
         """Extract dates from document"""
-        date_patterns = [
-            r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b',
-            r'\b\d{4}[/-]\d{1,2}[/-]\d{1,2}\b',
-            r'\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{1,2},?\s+\d{4}\b'
-        ]
-        
-        dates = []
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            dates.extend(matches)
-        
-        return list(set(dates))[:5]
+        if len(text_lower) == len(text):
+            # Lowercasing kept every character in place, so match spans in the lowercased
+            # text are read from the original to keep month names as written
+            dates = (text[match.start():match.end()] for match in DATE_RE.finditer(text_lower))
+        else:
+            dates = (match.group() for match in DATE_CASELESS_RE.finditer(text))
+        
+        # Ordered and deduplicated like the entities, so the first five distinct dates end the scan
+        found = {}
+        for date in dates:
+            found[date] = None
+            if len(found) == 5:
+                break
+        return list(found)
     
     def _extract_entities(self, text: str) -> List[str]:
         """Extract named entities (companies, organizations, etc.)"""
-        entities = []
+        # Ordered and deduplicated, so the first ten distinct entities end the scan
+        entities = {}
         
         # Look for capitalized phrases that might be entities
         lines = text.split('\n')
         for line in lines:
             words = line.split()
-            for i, word in enumerate(words):
-                if word[0].isupper() and len(word) > 2:
-                    # Check if it's part of a multi-word entity
-                    entity = word
-                    j = i + 1
-                    while j < len(words) and words[j][0].isupper():
-                        entity += " " + words[j]
-                        j += 1
-                    if len(entity.split()) >= 2:
-                        entities.append(entity)
-        
-        return list(set(entities))[:10]
+            i = 0
+            while i < len(words):
+                if not words[i][0].isupper():
+                    i += 1
+                    continue
+                
+                # Find the end of this run of capitalized words once
+                run_end = i + 1
+                while run_end < len(words) and words[run_end][0].isupper():
+                    run_end += 1
+                
+                # Each word of the run longer than two characters starts a
+                # multi-word entity running to the end of the run
+                for start in range(i, run_end - 1):
+                    if len(words[start]) > 2:
+                        entities[" ".join(words[start:run_end])] = None
+                        if len(entities) == 10:
+                            return list(entities)
+                i = run_end
+        
+        return list(entities)
     
     def _generate_summary(self, text: str) -> str:
         """Generate a summary of the document"""
-        sentences = text.split('.')
-        if len(sentences) > 3:
-            summary = '. '.join(sentences[:3]) + '.'
-        else:
-            summary = text
+        # Find the end of the third sentence without splitting the whole document
+        end = -1
+        for _ in range(3):
+            end = text.find('.', end + 1)
+            if end == -1:
+                break
+        summary = text[:end + 1] if end != -1 else text
         
         return summary[:300] + "..." if len(summary) > 300 else summary
\ No newline at end of file
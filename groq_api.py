@@ -1,145 +1,353 @@
 import os
-from openai import OpenAI
+import copy
+import asyncio
+import hashlib
+import weakref
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 import logging
 import re
+from cache import LRUCache
 
 load_dotenv()
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class GroqAPI:
-    def __init__(self):
-        self.client = OpenAI(
-            api_key=os.getenv("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
+# Read once, after load_dotenv, and shared by the sync and async clients
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+GROQ_MODEL = "llama3-70b-8192"
+
+# Upper bound on the length of an answer. Policy answers are usually a few short
+# paragraphs, and decoding time grows with every generated token
+ANSWER_MAX_TOKENS = 512
+
+# Appended to general answers when the question fits a more specific query type
+SUGGESTION_NOTE = "\n\n💡 Tip: For more specific information about this topic, try using the '{}' query type."
+
+# Keyword patterns for each query type, in priority order for ties. Every pattern starts at a
+# word boundary, which QUERY_TYPE_RE adds once in front of them all
+QUERY_TYPE_PATTERNS = {
+    "coverage": [
+        r'coverage\b', r'covered\b', r'benefits\b', r'included\b', r'protection\b',
+        r'what\s+is\s+covered\b', r'what\s+does\s+it\s+cover\b'
+    ],
+    "exclusions": [
+        r'exclusion\b', r'excluded\b', r'not\s+covered\b', r'limitation\b', r'restriction\b',
+        r'what\s+is\s+not\s+covered\b', r'what\s+are\s+the\s+exclusions\b'
+    ],
+    "claims": [
+        r'claim\b', r'claims\s+process\b', r'file\s+a\s+claim\b', r'how\s+to\s+claim\b',
+        r'claim\s+procedure\b', r'claim\s+timeline\b'
+    ],
+    "premium": [
+        r'premium\b', r'cost\b', r'price\b', r'payment\b', r'fee\b', r'installment\b',
+        r'how\s+much\b', r'payment\s+schedule\b'
+    ],
+    "duration": [
+        r'duration\b', r'period\b', r'term\b', r'policy\s+term\b', r'policy\s+period\b',
+        r'how\s+long\b', r'length\b', r'validity\b', r'when\s+does\s+it\s+expire\b'
+    ],
+    "terms": [
+        r'terms\b', r'conditions\b', r'terms\s+and\s+conditions\b', r'contractual\b',
+        r'obligation\b', r'requirements\b'
+    ],
+    "definitions": [
+        r'definition\b', r'define\b', r'meaning\b', r'terminology\b', r'glossary\b',
+        r'what\s+does\s+\w+\s+mean\b'
+    ]
+}
+
+# A keyword's specificity is its number of words, so a phrase such as "not covered"
+# outweighs the single word "covered" it contains
+QUERY_TYPE_KEYWORDS = sorted(
+    (
+        (pattern, query_type, len(pattern.split(r'\s+')))
+        for query_type, patterns in QUERY_TYPE_PATTERNS.items()
+        for pattern in patterns
+    ),
+    key=lambda keyword: -keyword[2]
+)
+
+# All patterns in one regex, most specific first. The lookahead makes every word start
+# a candidate, so overlapping keywords are all seen in one pass, and each word start
+# reports its most specific keyword. Each keyword ends in an empty group whose number
+# identifies it; wrapping the keywords themselves in groups would make the scan much slower
+QUERY_TYPE_RE = re.compile(r'\b(?=' + '|'.join(f'(?:{pattern})()' for pattern, _, _ in QUERY_TYPE_KEYWORDS) + ')')
+QUERY_TYPE_PRIORITY = {query_type: priority for priority, query_type in enumerate(QUERY_TYPE_PATTERNS)}
+
+# Connection pool shared by all Groq requests; sized above the app's concurrent callers
+# (request threads plus the hackrx worker pool) so keep-alive connections are reused
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+
+HTTP_LIMITS = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+)
+
+# Groq usually answers within a few seconds, so a call that has not responded well past
+# that is abandoned and retried (with the client's exponential backoff) rather than
+# waited on for the client's default of ten minutes
+HTTP_TIMEOUT = httpx.Timeout(15.0, connect=3.0)
+HTTP_MAX_RETRIES = 2
+
+@lru_cache(maxsize=None)
+def get_client():
+    """Create the process-wide Groq client on first use"""
+    return OpenAI(
+        api_key=GROQ_API_KEY,
+        base_url=GROQ_BASE_URL,
+        timeout=HTTP_TIMEOUT,
+        max_retries=HTTP_MAX_RETRIES,
+        http_client=httpx.Client(limits=HTTP_LIMITS)
+    )
+
+# Groq calls are network-bound, so several questions are answered concurrently. The
+# pool is shared by all requests, which keeps the calls in flight within the rate limit
+QUERY_MAX_WORKERS = 16
+query_executor = ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS)
+
+# Answers to identical prompts, keyed by a hash of the model and messages, so a
+# repeated question about the same context skips the network round trip
+RESPONSE_CACHE_SIZE = 512
+response_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+
+def get_response_cache_key(messages):
+    """Hash the model and chat messages into a response cache key"""
+    digest = hashlib.blake2b(GROQ_MODEL.encode(), digest_size=16)
+    for message in messages:
+        digest.update(b"\x00" + message["role"].encode() + b"\x00" + message["content"].encode())
+    return digest.hexdigest()
+
+# Async connections belong to the event loop that opened them, so each loop gets its own client
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    """Return the async Groq client for the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=GROQ_API_KEY,
+            base_url=GROQ_BASE_URL,
+            timeout=HTTP_TIMEOUT,
+            max_retries=HTTP_MAX_RETRIES,
+            http_client=httpx.AsyncClient(limits=HTTP_LIMITS)
         )
+        _async_clients[loop] = client
+    return client
+
+class GroqAPI:
+    # System prompt for each query type, built once with the class
+    SYSTEM_PROMPTS = {
+        "general": "You're a helpful assistant answering document-based questions. Respond politely and help people to find the information they need. If the question seems to be about a specific aspect of the insurance policy (like coverage, exclusions, claims, premium, duration, terms, or definitions), suggest which query type would be most appropriate for getting more detailed information.",
+        
+        "coverage": "You are an insurance policy expert specializing in coverage details. Analyze the provided context to answer questions about what is covered under the insurance policy. Be specific about coverage limits, conditions, and inclusions.",
+        
+        "exclusions": "You are an insurance policy expert specializing in policy exclusions. Analyze the provided context to answer questions about what is not covered under the insurance policy. Clearly identify specific exclusions, limitations, and conditions that void coverage.",
+        
+        "claims": "You are an insurance claims specialist. Analyze the provided context to answer questions about the claims process. Provide clear, step-by-step guidance on how to file claims, required documentation, and claim timelines.",
+        
+        "premium": "You are an insurance premium specialist. Analyze the provided context to answer questions about premium payments, costs, fees, and payment schedules. Include information about grace periods, late payment consequences, and payment options.",
+        
+        "duration": "You are an insurance policy duration expert. Analyze the provided context to answer questions about policy periods, term lengths, renewal conditions, and coverage timeframes. Be specific about start and end dates, renewal processes, and policy continuity.",
+        
+        "terms": "You are an insurance terms and conditions specialist. Analyze the provided context to answer questions about policy terms, conditions, and contractual obligations. Explain legal terms in clear language and highlight important conditions policyholders should be aware of.",
+        
+        "definitions": "You are an insurance terminology expert. Analyze the provided context to answer questions about defined terms in the policy. Provide clear definitions for insurance-specific terminology and explain how these definitions apply to the policy coverage.",
+    }
+    
+    @property
+    def client(self):
+        # Every instance shares one client, and with it one pool of open connections.
+        # It is created on the first request, not when GroqAPI is instantiated
+        return get_client()
     
     def get_system_prompt(self, query_type):
         """Generate system prompt based on query type"""
-        prompts = {
-            "general": "You're a helpful assistant answering document-based questions. Respond politely and help people to find the information they need. If the question seems to be about a specific aspect of the insurance policy (like coverage, exclusions, claims, premium, duration, terms, or definitions), suggest which query type would be most appropriate for getting more detailed information.",
-            
-            "coverage": "You are an insurance policy expert specializing in coverage details. Analyze the provided context to answer questions about what is covered under the insurance policy. Be specific about coverage limits, conditions, and inclusions.",
-            
-            "exclusions": "You are an insurance policy expert specializing in policy exclusions. Analyze the provided context to answer questions about what is not covered under the insurance policy. Clearly identify specific exclusions, limitations, and conditions that void coverage.",
-            
-            "claims": "You are an insurance claims specialist. Analyze the provided context to answer questions about the claims process. Provide clear, step-by-step guidance on how to file claims, required documentation, and claim timelines.",
-            
-            "premium": "You are an insurance premium specialist. Analyze the provided context to answer questions about premium payments, costs, fees, and payment schedules. Include information about grace periods, late payment consequences, and payment options.",
-            
-            "duration": "You are an insurance policy duration expert. Analyze the provided context to answer questions about policy periods, term lengths, renewal conditions, and coverage timeframes. Be specific about start and end dates, renewal processes, and policy continuity.",
-            
-            "terms": "You are an insurance terms and conditions specialist. Analyze the provided context to answer questions about policy terms, conditions, and contractual obligations. Explain legal terms in clear language and highlight important conditions policyholders should be aware of.",
-            
-            "definitions": "You are an insurance terminology expert. Analyze the provided context to answer questions about defined terms in the policy. Provide clear definitions for insurance-specific terminology and explain how these definitions apply to the policy coverage.",
-        }
-        
-        return prompts.get(query_type, prompts["general"])
+        return self.SYSTEM_PROMPTS.get(query_type, self.SYSTEM_PROMPTS["general"])
     
     def suggest_query_type(self, query):
         """Suggest a more specific query type based on the question content"""
-        query_lower = query.lower()
-        
-        # Define keyword patterns for each query type
-        query_type_patterns = {
-            "coverage": [
-                r'\bcoverage\b', r'\bcovered\b', r'\bbenefits\b', r'\bincluded\b', r'\bprotection\b',
-                r'\bwhat\s+is\s+covered\b', r'\bwhat\s+does\s+it\s+cover\b'
-            ],
-            "exclusions": [
-                r'\bexclusion\b', r'\bexcluded\b', r'\bnot\s+covered\b', r'\blimitation\b', r'\brestriction\b',
-                r'\bwhat\s+is\s+not\s+covered\b', r'\bwhat\s+are\s+the\s+exclusions\b'
-            ],
-            "claims": [
-                r'\bclaim\b', r'\bclaims\s+process\b', r'\bfile\s+a\s+claim\b', r'\bhow\s+to\s+claim\b',
-                r'\bclaim\s+procedure\b', r'\bclaim\s+timeline\b'
-            ],
-            "premium": [
-                r'\bpremium\b', r'\bcost\b', r'\bprice\b', r'\bpayment\b', r'\bfee\b', r'\binstallment\b',
-                r'\bhow\s+much\b', r'\bpayment\s+schedule\b'
-            ],
-            "duration": [
-                r'\bduration\b', r'\bperiod\b', r'\bterm\b', r'\bpolicy\s+term\b', r'\bpolicy\s+period\b',
-                r'\bhow\s+long\b', r'\blength\b', r'\bvalidity\b', r'\bwhen\s+does\s+it\s+expire\b'
-            ],
-            "terms": [
-                r'\bterms\b', r'\bconditions\b', r'\bterms\s+and\s+conditions\b', r'\bcontractual\b',
-                r'\bobligation\b', r'\brequirements\b'
-            ],
-            "definitions": [
-                r'\bdefinition\b', r'\bdefine\b', r'\bmeaning\b', r'\bterminology\b', r'\bglossary\b',
-                r'\bwhat\s+does\s+\w+\s+mean\b'
-            ]
+        # One scan scores each query type by the specificity of its keywords; ties go
+        # to the query type listed first
+        scores = {}
+        for match in QUERY_TYPE_RE.finditer(query.lower()):
+            _, query_type, specificity = QUERY_TYPE_KEYWORDS[match.lastindex - 1]
+            scores[query_type] = scores.get(query_type, 0) + specificity
+        suggested = max(scores, key=lambda query_type: (scores[query_type], -QUERY_TYPE_PRIORITY[query_type]), default=None)
+        
+        if suggested:
+            logger.debug(f"Suggested query type: {suggested} for query: {query}")
+        return suggested
+    
+    def build_messages(self, query, context, query_type="general"):
+        """Build the chat messages for a question about a document"""
+        # The context goes in the system message after the query type prompt, so every
+        # question about the same context starts with an identical prefix that the
+        # provider can serve from its prompt cache; only the question comes after it
+        system_prompt = f"{self.get_system_prompt(query_type)}\n\nContext:\n{context}"
+        user_prompt = f"Question:\n{query}"
+        
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def build_response(self, response, query, query_type="general"):
+        """Turn a chat completion into the answer dict returned to callers"""
+        answer = response.choices[0].message.content.strip()
+        token_usage = {
+            "input_tokens": response.usage.prompt_tokens,
+            "output_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens
         }
         
-        # Check each query type for matching patterns
-        for query_type, patterns in query_type_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, query_lower):
-                    logger.debug(f"Suggested query type: {query_type} for query: {query}")
-                    return query_type
+        # For general queries, suggest a more specific query type if applicable
+        suggested_query_type = None
+        if query_type == "general":
+            suggested_query_type = self.suggest_query_type(query)
+            
+            # If a more specific query type is suggested, add a note to the answer
+            if suggested_query_type:
+                answer += SUGGESTION_NOTE.format(suggested_query_type)
+                logger.debug(f"Added suggestion note for query type: {suggested_query_type}")
+        
+        # Log successful response with query type, and how much of the prompt the provider had cached
+        prompt_details = getattr(response.usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(prompt_details, "cached_tokens", None) or 0
+        logger.debug(f"Groq API response received for query_type: {query_type}, tokens used: {token_usage['total_tokens']}, cached prompt tokens: {cached_tokens}")
+        
+        # Include query type and suggestion in the response for debugging
+        response_data = {
+            "answer": answer, 
+            "token_usage": token_usage,
+            "query_type_used": query_type,
+            "debug_info": f"Answered using {query_type} mode"
+        }
         
-        # No specific query type identified
-        return None
+        # Add suggested query type if applicable
+        if suggested_query_type:
+            response_data["suggested_query_type"] = suggested_query_type
+            response_data["debug_info"] += f" (suggested: {suggested_query_type})"
+        
+        return response_data
     
-    def query_document(self, query, context, query_type="general"):
-        # Get the appropriate system prompt based on query type
-        system_prompt = self.get_system_prompt(query_type)
+    def query_document(self, query, context, query_type="general", stream=False):
+        """Answer a question about the context; with stream=True, return an iterator of answer text"""
+        messages = self.build_messages(query, context, query_type)
+        if stream:
+            return self.stream_answer(messages, query, query_type)
         
-        # Create the user prompt with context and question
-        user_prompt = f"Context:\n{context}\n\nQuestion:\n{query}"
+        cache_key = get_response_cache_key(messages)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Groq response cache hit for query_type: {query_type}")
+            return copy.deepcopy(cached)
         
         # Log the query type for debugging
         logger.debug(f"Groq API called with query_type: {query_type}")
         
         try:
             response = self.client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3
+                model=GROQ_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=ANSWER_MAX_TOKENS
             )
-            
-            answer = response.choices[0].message.content.strip()
-            token_usage = {
-                "input_tokens": response.usage.prompt_tokens,
-                "output_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
-            
-            # For general queries, suggest a more specific query type if applicable
-            suggested_query_type = None
-            if query_type == "general":
-                suggested_query_type = self.suggest_query_type(query)
-                
-                # If a more specific query type is suggested, add a note to the answer
-                if suggested_query_type:
-                    suggestion_note = f"\n\n💡 Tip: For more specific information about this topic, try using the '{suggested_query_type}' query type."
-                    answer += suggestion_note
-                    logger.debug(f"Added suggestion note for query type: {suggested_query_type}")
-            
-            # Log successful response with query type
-            logger.debug(f"Groq API response received for query_type: {query_type}, tokens used: {token_usage['total_tokens']}")
-            
-            # Include query type and suggestion in the response for debugging
-            response_data = {
-                "answer": answer, 
-                "token_usage": token_usage,
-                "query_type_used": query_type,
-                "debug_info": f"Answered using {query_type} mode"
-            }
-            
-            # Add suggested query type if applicable
+            response_data = self.build_response(response, query, query_type)
+            # Callers get their own copy, so changes they make never reach the cache
+            response_cache.put(cache_key, copy.deepcopy(response_data))
+            return response_data
+        
+        except Exception as e:
+            logger.error(f"Groq API error with query_type {query_type}: {str(e)}")
+            raise Exception(f"Groq API error: {str(e)}")
+    
+    def query_many(self, queries, contexts, query_type="general"):
+        """Answer each question with its own context concurrently, returning results in order"""
+        return list(query_executor.map(
+            lambda query_context: self.query_document(*query_context, query_type=query_type),
+            zip(queries, contexts)
+        ))
+    
+    def stream_answer(self, messages, query, query_type="general"):
+        """Start a streamed answer and return an iterator over its text
+        
+        The request is made before returning, so errors such as rate limits or a bad key
+        raise here, while the caller can still report or retry them.
+        """
+        logger.debug(f"Groq API streaming with query_type: {query_type}")
+        
+        try:
+            stream = self.client.chat.completions.create(
+                model=GROQ_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=ANSWER_MAX_TOKENS,
+                stream=True
+            )
+        except Exception as e:
+            logger.error(f"Groq API error with query_type {query_type}: {str(e)}")
+            raise Exception(f"Groq API error: {str(e)}")
+        
+        return self.iter_answer(stream, query, query_type)
+    
+    def iter_answer(self, stream, query, query_type="general"):
+        """Yield the answer text of an open stream as Groq generates it, followed by any query type tip"""
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        except Exception as e:
+            logger.error(f"Groq API error with query_type {query_type}: {str(e)}")
+            raise Exception(f"Groq API error: {str(e)}")
+        
+        # For general queries, suggest a more specific query type if applicable
+        if query_type == "general":
+            suggested_query_type = self.suggest_query_type(query)
             if suggested_query_type:
-                response_data["suggested_query_type"] = suggested_query_type
-                response_data["debug_info"] += f" (suggested: {suggested_query_type})"
-            
+                yield SUGGESTION_NOTE.format(suggested_query_type)
+    
+    async def aquery_document(self, query, context, query_type="general"):
+        """Async query_document, so many questions can be awaited together with asyncio.gather"""
+        messages = self.build_messages(query, context, query_type)
+        cache_key = get_response_cache_key(messages)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Groq response cache hit for query_type: {query_type}")
+            return copy.deepcopy(cached)
+        
+        logger.debug(f"Groq API called asynchronously with query_type: {query_type}")
+        
+        try:
+            response = await get_async_client().chat.completions.create(
+                model=GROQ_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=ANSWER_MAX_TOKENS
+            )
+            response_data = self.build_response(response, query, query_type)
+            response_cache.put(cache_key, copy.deepcopy(response_data))
             return response_data
         
         except Exception as e:
             logger.error(f"Groq API error with query_type {query_type}: {str(e)}")
-            raise Exception(f"Groq API error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Groq API error: {str(e)}")
+    
+    async def aquery_many(self, queries, contexts, query_type="general"):
+        """Async query_many; at most QUERY_MAX_WORKERS questions are awaited at a time"""
+        semaphore = asyncio.Semaphore(QUERY_MAX_WORKERS)
+        
+        async def answer(query, context):
+            async with semaphore:
+                return await self.aquery_document(query, context, query_type)
+        
+        return await asyncio.gather(*(answer(query, context) for query, context in zip(queries, contexts)))
@@ -0,0 +1,95 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import fitz  # PyMuPDF
+
+# Plain text extraction: no image blocks, clipped to the page
+PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# PDFs with at least this many pages are split across worker processes. PyMuPDF
+# cannot be used from several threads, so pages are shared out by process instead
+PARALLEL_MIN_PAGES = 64
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# Malformed PDFs can make MuPDF print one message per broken object; errors
+# that matter still surface as exceptions
+fitz.TOOLS.mupdf_display_errors(False)
+
+# gunicorn serves requests on several threads, so MuPDF use in this process is
+# serialized; large PDFs are extracted in parallel by worker processes instead
+_fitz_lock = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Create the worker pool on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers import this module, and also re-import the script the app
+            # was started from, so that script must keep its heavy setup lazy
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+def discard_executor(executor):
+    """Drop a pool whose worker died, so the next large PDF starts a new one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+def iter_page_texts(doc, start=0, stop=None):
+    """Yield the text of each page in [start, stop) of an open document that has any"""
+    stop = doc.page_count if stop is None else stop
+    # Only one page is loaded at a time, so the working set stays at a single page
+    for page_number in range(start, stop):
+        page = doc.load_page(page_number)
+        # A page without fonts holds only images or vector graphics, so
+        # skip it before MuPDF interprets its content stream
+        if page.get_fonts():
+            # Unsorted extraction keeps content-stream order and skips the layout sort
+            page_text = page.get_text("text", flags=PDF_TEXT_FLAGS, sort=False)
+            if page_text.strip():
+                yield page_text
+        page = None
+
+def extract_page_range(file_path, start, stop):
+    """Extract the text of pages [start, stop) of a PDF file; runs in a worker process"""
+    with fitz.open(file_path) as doc:
+        return "".join(iter_page_texts(doc, start, stop))
+
+def extract_text_from_pdf(file_path):
+    """Extract text from PDF file"""
+    try:
+        with _fitz_lock, fitz.open(file_path) as doc:
+            page_count = doc.page_count
+            if page_count < PARALLEL_MIN_PAGES or MAX_WORKERS < 2:
+                return "".join(iter_page_texts(doc))
+
+        # Split large documents into one contiguous page range per worker
+        step = -(-page_count // MAX_WORKERS)
+        executor = get_executor()
+        try:
+            futures = [
+                executor.submit(extract_page_range, file_path, start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
+            return "".join(future.result() for future in futures)
+        except BrokenProcessPool:
+            # A worker crashed (for example inside MuPDF); a broken pool never recovers
+            discard_executor(executor)
+            raise
+    except Exception as e:
+        return "Error extracting text from PDF: " + str(e)
+
+def extract_text_from_pdf_bytes(data):
+    """Extract text from PDF bytes held in memory"""
+    try:
+        with _fitz_lock, fitz.open(stream=data, filetype="pdf") as doc:
+            return "".join(iter_page_texts(doc))
+    except Exception as e:
+        return "Error extracting text from PDF: " + str(e)
@@ -149,15 +149,23 @@ def main():
     
     passed = 0
     total = len(tests)
+    timings = []
     
     for test in tests:
+        # Time each check so latency regressions show up alongside failures
+        start = time.perf_counter()
         if test():
             passed += 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        timings.append((test.__name__, elapsed_ms))
+        print(f"   ⏱️  {elapsed_ms:.1f} ms")
         print()
     
     # Summary
     print("=" * 50)
     print(f"📊 Test Results: {passed}/{total} tests passed")
+    for name, elapsed_ms in timings:
+        print(f"   {name}: {elapsed_ms:.1f} ms")
     
     if passed == total:
         print("🎉 All tests passed! Your application is working correctly.")